@@ -8,76 +8,304 @@ main.py - Start llama-server(s) and the WebUI (Vite Preview)
 - Cleans up on shutdown
 """
 
-import requests
+import json
+import os
 import sys
-import yaml
 import signal
 import subprocess
-from pathlib import Path
-from flask import Flask, jsonify
-from flask_cors import CORS
+from concurrent.futures import ThreadPoolExecutor
 
-ROOT_DIR = Path(__file__).parent.resolve()
-MODELS_YAML = ROOT_DIR / "models" / "models.yaml"
-WEBUI_DIR = ROOT_DIR / "webui"
-WEBUI_DIST = WEBUI_DIR / "dist"
+import model_config
+from model_config import (build_command, build_commands, build_models_payload,
+                          root_dir, root_dir_str, write_w_models_json)
+from functools import cache
+
+@cache
+def webui_dir():
+    return root_dir() / "webui"
+
+@cache
+def webui_dist():
+    return webui_dir() / "dist"
 
 procs = {}
 models = {}
+cmds = {}  # name -> pre-resolved argv, filled once after load_models()
+shutting_down = False  # set by stop_all; blocks watchdog restarts
+_restart_timers = set()  # pending watchdog Timers, cancelled on shutdown
+child_env = None  # environment shared by every child, built once after load
+
+def build_child_env(models):
+    """Environment passed to all children, built exactly once and shared
+    by reference across every Popen call.
+
+    WGPT_MODELS is a compact {name: base_url} map serialized with
+    json.dumps — enough for a child to reach any model server, without
+    leaking the full config (argv, local gguf paths, api_key fields)
+    into every child's environment.
+    """
+    global child_env
+    if child_env is None:
+        endpoints = {}
+        for name, cfg in models.items():
+            port = _runtime_port(cfg.get("runtime", {}))
+            if port is not None:
+                endpoints[name] = f"http://127.0.0.1:{port}"
+        env = dict(os.environ)
+        env["WGPT_MODELS"] = json.dumps(endpoints, separators=(",", ":"))
+        child_env = env
+    return child_env
 
 def load_models():
     global models
-    if not MODELS_YAML.exists():
-        print(f"[ERROR] {MODELS_YAML} not found")
-        sys.exit(1)
-    with open(MODELS_YAML, "r") as f:
-        data = yaml.safe_load(f)
-    if not isinstance(data, dict) or "models" not in data:
-        print("[ERROR] models.yaml must contain a 'models:' key")
-        sys.exit(1)
-    models = data["models"]
+    models = model_config.load_models()
     return models
 
-def start_model_server(name, cfg):
-    runtime = cfg.get("runtime", {})
-    bin_path = runtime.get("bin")
-    args = runtime.get("args", [])
-    if not bin_path:
-        print(f"[WARN] No runtime.bin for {name}, skipping")
+def _runtime_port(runtime):
+    """Port a model server listens on, from runtime.port or its --port arg."""
+    port = runtime.get("port")
+    if port is None:
+        args = runtime.get("args", [])
+        for i, a in enumerate(args):
+            if str(a) == "--port" and i + 1 < len(args):
+                port = args[i + 1]
+                break
+    try:
+        return int(port)
+    except (TypeError, ValueError):
         return None
-    bin_abs = (ROOT_DIR / bin_path) if not Path(bin_path).is_absolute() else Path(bin_path)
-    if not bin_abs.exists():
-        print(f"[ERROR] Binary not found: {bin_abs}")
+
+def _backend_url():
+    """llama-server origin for the UI's same-origin /v1 and /props calls —
+    the same target the vite preview proxy pointed at."""
+    for cfg in models.values():
+        port = _runtime_port(cfg.get("runtime", {}))
+        if port is not None:
+            return f"http://127.0.0.1:{port}"
+    return "http://127.0.0.1:8081"
+
+def prewarm_model_server(name, port):
+    """Poll /health until the server is up, then fire a 1-token completion
+    so weight paging happens now instead of on the first user request."""
+    import time
+
+    import requests
+    url = f"http://127.0.0.1:{port}"
+    delay = 0.2
+    while True:
+        # single lookup: the reap loop can pop the entry at any moment
+        p = procs.get(name)
+        if p is None or p.poll() is not None:
+            return  # server died (or was reaped) before it came up
+        try:
+            if requests.get(f"{url}/health", timeout=0.2).status_code == 200:
+                break
+        except requests.RequestException:
+            pass
+        time.sleep(delay)
+        delay = min(delay * 2, 5.0)
+    try:
+        requests.post(f"{url}/completion",
+                      json={"prompt": "", "n_predict": 1, "stream": False},
+                      timeout=300)
+        print(f"[INFO] Prewarmed {name} on port {port}")
+    except requests.RequestException as e:
+        print(f"[WARN] Prewarm failed for {name}: {e}")
+
+def start_model_server(name, cfg):
+    if shutting_down:
+        return None  # late watchdog restart racing stop_all
+    cmd = cmds.get(name) or build_command(name, cfg)
+    if cmd is None:
         return None
 
-    cmd = [str(bin_abs)] + args
     print(f"[INFO] Starting {name}: {' '.join(cmd)}")
-    proc = subprocess.Popen(cmd, cwd=ROOT_DIR)
+    # cwd=None + close_fds=False + pre-absolutized argv keep the call
+    # posix_spawn-compatible; process_group=0 costs that fast path on
+    # 3.11 (newer CPython applies it via posix_spawn attrs), but group
+    # containment wins: killpg can tear down each server's whole tree
+    proc = subprocess.Popen(cmd, close_fds=False, env=child_env,
+                            process_group=0)
     procs[name] = proc
+
+    # Warm the weights in the background so cold TTFT overlaps WebUI startup
+    port = _runtime_port(cfg.get("runtime", {}))
+    if port is not None:
+        from threading import Thread
+        Thread(target=prewarm_model_server, args=(name, port), daemon=True).start()
     return proc
 
-def start_webui_preview():
-    if not WEBUI_DIR.exists():
-        print(f"[ERROR] WebUI directory not found: {WEBUI_DIR}")
+def start_webui_preview(port=8080):
+    if not webui_dir().exists():
+        print(f"[ERROR] WebUI directory not found: {webui_dir()}")
         return None
-    # Serve the built UI on :8080
-    cmd = ["npm", "run", "preview", "--", "--port", "8080"]
-    print("[INFO] Starting WebUI Preview on http://127.0.0.1:8080")
-    proc = subprocess.Popen(cmd, cwd=WEBUI_DIR)
+    cmd = ["npm", "run", "preview", "--", "--port", str(port)]
+    print(f"[INFO] Starting WebUI Preview on http://127.0.0.1:{port}")
+    proc = subprocess.Popen(cmd, cwd=webui_dir(), env=child_env,
+                            process_group=0)
     procs["webui"] = proc
     return proc
 
-def stop_all():
+def _signal_tree(p, sig):
+    """Signal a child's entire process group (each child leads its own,
+    via process_group=0), so grandchildren like npm's node die too."""
+    try:
+        os.killpg(p.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        try:
+            p.send_signal(sig)
+        except ProcessLookupError:
+            pass  # already gone
+
+def stop_all(timeout=5.0):
+    import os
+    import select
+    import time
+
+    # Block the watchdog first: a restart Timer firing during the grace
+    # wait below would spawn a server that outlives the controller
+    global shutting_down
+    shutting_down = True
+    for t in list(_restart_timers):
+        t.cancel()
+    _restart_timers.clear()
+
+    live = []
     for name, p in list(procs.items()):
         if p.poll() is None:
             print(f"[INFO] Stopping {name} (pid={p.pid})")
+            _signal_tree(p, signal.SIGTERM)
+            live.append((name, p))
+
+    # Reap the whole batch in one poll loop via pidfds, so the grace
+    # period is shared instead of 5s per child as with serial wait()
+    if live and hasattr(os, "pidfd_open"):
+        pending = {}
+        poller = select.poll()
+        for name, p in live:
             try:
-                p.terminate()
-                p.wait(timeout=5)
+                fd = os.pidfd_open(p.pid)
+            except OSError:
+                p.wait()  # already gone
+                continue
+            poller.register(fd, select.POLLIN)
+            pending[fd] = p
+        deadline = time.monotonic() + timeout
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            for fd, _ in poller.poll(remaining * 1000):
+                pending.pop(fd).wait()
+                poller.unregister(fd)
+                os.close(fd)
+        for fd, p in pending.items():
+            _signal_tree(p, signal.SIGKILL)
+            p.wait()
+            os.close(fd)
+    else:
+        for name, p in live:
+            try:
+                p.wait(timeout=timeout)
             except subprocess.TimeoutExpired:
-                p.kill()
+                _signal_tree(p, signal.SIGKILL)
     procs.clear()
 
+def reap_children():
+    """Collect any children that have exited; returns (name, returncode)
+    pairs for the reaped ones.
+
+    One waitid(P_ALL) drain replaces polling every Popen per wakeup: the
+    kernel names each exited pid directly, so cost scales with exits, not
+    with the number of live children. WNOWAIT peeks without reaping so
+    the matching Popen can collect its own status and stay consistent.
+    """
+    reaped = []
+    while True:
+        try:
+            info = os.waitid(os.P_ALL, 0, os.WEXITED | os.WNOHANG | os.WNOWAIT)
+        except ChildProcessError:
+            break  # no children at all
+        if info is None:
+            break  # children remain, none exited
+        # Resolve against a fresh per-iteration copy: watchdog Timer
+        # restarts add Popens to procs concurrently, so an entry-time
+        # snapshot goes stale and iterating the live dict can raise
+        # RuntimeError mid-insert
+        name = next((n for n, p in list(procs.items())
+                     if p.pid == info.si_pid), None)
+        if name is None:
+            # Untracked child; reap it so it can't wedge the WNOWAIT loop.
+            # Stealing a tracked Popen's status here would make _try_wait
+            # report a bogus clean exit, which is why the lookup above
+            # must be fresh
+            os.waitid(os.P_PID, info.si_pid, os.WEXITED | os.WNOHANG)
+            continue
+        p = procs.pop(name)
+        p.wait()
+        print(f"[INFO] {name} exited with code {p.returncode}")
+        reaped.append((name, p.returncode))
+    return reaped
+
+def run_until_webui_exit(webui_proc=None, max_restarts=3):
+    """Block until the WebUI process exits, reaping children as they die.
+
+    SIGCHLD wakes the loop through signal.set_wakeup_fd: the interpreter's
+    C-level handler writes the signal number to a self-pipe, so no Python
+    bytecode runs at delivery time and back-to-back exits coalesce into
+    one drained read. With webui_proc=None (UI served in-process) the
+    loop runs until a signal.
+
+    The loop doubles as a watchdog: a model server that dies with a
+    nonzero code is relaunched with exponential backoff, up to
+    max_restarts times per server.
+    """
+    import select
+    from threading import Timer
+
+    restarts = {}
+
+    def _restart(name):
+        if shutting_down or name in procs:  # tearing down, or relaunched by hand
+            return
+        start_model_server(name, models.get(name, {}))
+
+    rfd, wfd = os.pipe()
+    os.set_blocking(wfd, False)
+    old_wakeup = signal.set_wakeup_fd(wfd, warn_on_full_buffer=False)
+    # A handler must be registered for the C-level machinery to fire; the
+    # Python callback itself has nothing to do
+    signal.signal(signal.SIGCHLD, lambda sig, frame: None)
+    try:
+        first_pass = True  # catch children that died before the fd was armed
+        while webui_proc is None or webui_proc.poll() is None:
+            if not first_pass:
+                select.select([rfd], [], [])
+                os.read(rfd, 4096)  # drain coalesced signal bytes
+            first_pass = False
+            for name, code in reap_children():
+                if code == 0 or name not in cmds:
+                    continue  # clean exit, or not a model server
+                n = restarts.get(name, 0) + 1
+                if n > max_restarts:
+                    print(f"[ERROR] {name} keeps crashing; giving up")
+                    continue
+                restarts[name] = n
+                delay = min(2 ** (n - 1), 30)
+                print(f"[WARN] {name} crashed (code {code}); "
+                      f"restart {n}/{max_restarts} in {delay}s")
+                _restart_timers.difference_update(
+                    {t for t in _restart_timers if not t.is_alive()})
+                t = Timer(delay, _restart, args=(name,))
+                t.daemon = True
+                _restart_timers.add(t)
+                t.start()
+    finally:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.set_wakeup_fd(old_wakeup)
+        os.close(rfd)
+        os.close(wfd)
+
 def handle_signal(sig, frame):
     print("\n[INFO] Caught signal, shutting down...")
     stop_all()
@@ -86,43 +314,150 @@ def handle_signal(sig, frame):
 # ----------------------
 # Flask app for /props
 # ----------------------
-app = Flask(__name__, static_folder=str(WEBUI_DIST), static_url_path="")
-CORS(app, resources={r"/w/*": {"origins": "*"}})
+# Serialized /w/models body; models are loaded once per process, so the
+# payload is immutable and can be encoded a single time at startup
+_models_json = None
 
-@app.route("/w/models", methods=["GET"])
-def wgpt_models():
-    """
-    Return enriched models list based on models.yaml
-    This avoids clashing with llama-server's /v1/models
+def create_app():
+    """Build the Flask props app. Imported lazily: Flask/CORS only load
+    when the endpoint is actually enabled (WGPT_PROPS_SERVER=1)."""
+    from flask import Flask, Response, request
+    from flask_cors import CORS
+
+    app = Flask(__name__, static_folder=str(webui_dist()), static_url_path="")
+    CORS(app, resources={r"/w/*": {"origins": "*"}})
+
+    @app.route("/")
+    def index():
+        return app.send_static_file("index.html")
+
+    @app.route("/w/models", methods=["GET"])
+    def wgpt_models():
+        """
+        Return enriched models list based on models.yaml
+        This avoids clashing with llama-server's /v1/models
+        """
+        return Response(_models_json or build_models_payload(models),
+                        mimetype="application/json")
+
+    @app.route("/props", methods=["GET"])
+    @app.route("/v1/<path:path>", methods=["GET", "POST"])
+    def llama_proxy(path=None):
+        """
+        Reverse-proxy /v1 and /props to llama-server, mirroring the vite
+        preview proxy (vite.config.ts) — the frontend calls these as
+        same-origin paths, so serving dist in-process must forward them
+        """
+        import requests
+        upstream = requests.request(
+            request.method,
+            f"{_backend_url()}{request.path}",
+            params=request.args,
+            data=request.get_data(),
+            headers={k: v for k, v in request.headers if k.lower() != "host"},
+            stream=True,
+            timeout=300,
+        )
+        # hop-by-hop headers must not be relayed; Flask re-frames the body
+        drop = {"transfer-encoding", "connection", "content-encoding",
+                "content-length"}
+        headers = [(k, v) for k, v in upstream.raw.headers.items()
+                   if k.lower() not in drop]
+        return Response(upstream.iter_content(chunk_size=None),
+                        status=upstream.status_code, headers=headers)
+
+    return app
+
+def serve_app_in_thread(app, port):
+    """Serve a Flask app on a daemon thread: waitress when installed,
+    the Werkzeug dev server otherwise."""
+    from threading import Thread
+    try:
+        from waitress import serve
+        target = lambda: serve(app, host="0.0.0.0", port=port, threads=4)
+    except ImportError:
+        target = lambda: app.run(port=port, host="0.0.0.0", debug=False,
+                                 use_reloader=False)
+    Thread(target=target, daemon=True).start()
+
+def exec_model_server(name):
+    """Replace this process with the named model server via execvp.
+
+    For single-model deployments the Python supervisor is pure overhead;
+    exec'ing hands the PID (and signal handling) straight to llama-server.
     """
-    enriched = []
-    for name, cfg in models.items():
-        enriched.append({
-            "id": name,  # short stable id
-            "name": name,
-            "display_name": cfg.get("display_name", Path(name).stem),
-            "type": cfg.get("type", "llama"),
-            "runtime": cfg.get("runtime", {}),
-        })
-    return {"object": "list", "data": enriched}
+    cfg = models.get(name)
+    if cfg is None:
+        print(f"[ERROR] Unknown model for WGPT_EXEC: {name}")
+        sys.exit(1)
+    cmd = cmds.get(name) or build_command(name, cfg)
+    if cmd is None:
+        sys.exit(1)
+    print(f"[INFO] Exec'ing {name}: {' '.join(cmd)}")
+    os.chdir(root_dir_str())
+    os.execvp(cmd[0], cmd)
 
-if __name__ == "__main__":
+def parse_args(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Start llama-server(s) and the WebUI")
+    parser.add_argument("--ui-port", type=int, default=8080,
+                        help="port for the built WebUI (default: 8080)")
+    parser.add_argument("--props-port", type=int, default=5000,
+                        help="port for the live /w/models endpoint (default: 5000)")
+    parser.add_argument("--props-server", action="store_true",
+                        default=os.environ.get("WGPT_PROPS_SERVER") == "1",
+                        help="also serve the live /w/models endpoint")
+    parser.add_argument("--no-webui", action="store_true",
+                        help="start model servers only, no UI")
+    parser.add_argument("--exec", dest="exec_model", metavar="MODEL",
+                        default=os.environ.get("WGPT_EXEC"),
+                        help="exec the named model server in place of the launcher")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    global models, cmds, child_env, _models_json
+
+    opts = parse_args(argv)
     signal.signal(signal.SIGINT, handle_signal)
     signal.signal(signal.SIGTERM, handle_signal)
 
     models = load_models()
+    cmds = build_commands(models)
+    child_env = build_child_env(models)
 
-    # Start llama-server(s)
-    for name, cfg in models.items():
-        start_model_server(name, cfg)
+    # --exec/WGPT_EXEC: become that server instead of supervising it
+    if opts.exec_model:
+        exec_model_server(opts.exec_model)
+    _models_json = build_models_payload(models)
 
-    # Start WebUI + Flask props on port 5000
-    from threading import Thread
-    Thread(target=lambda: app.run(port=5000, host="0.0.0.0", debug=False, use_reloader=False)).start()
+    # Snapshot the models payload as a static file so the built UI can
+    # fetch it without a live endpoint
+    write_w_models_json(models)
+
+    # Start llama-server(s) concurrently so N spawn latencies overlap
+    if models:
+        with ThreadPoolExecutor(max_workers=len(models)) as ex:
+            list(ex.map(lambda kv: start_model_server(*kv), models.items()))
 
-    # Start Vite Preview
-    webui_proc = start_webui_preview()
+    # The live /w/models endpoint is redundant with the static snapshot;
+    # keep it available as a flag for dev setups without dist
+    if opts.props_server:
+        serve_app_in_thread(create_app(), opts.props_port)
+
+    # Serve the built UI straight from this process when dist exists; an
+    # extra `npm run preview` node just to hand out static files is waste
+    webui_proc = None
+    if not opts.no_webui:
+        if (webui_dist() / "index.html").exists():
+            print(f"[INFO] Serving built WebUI on http://127.0.0.1:{opts.ui_port}")
+            serve_app_in_thread(create_app(), opts.ui_port)
+        else:
+            webui_proc = start_webui_preview(opts.ui_port)
     try:
-        webui_proc.wait()
+        run_until_webui_exit(webui_proc)
     finally:
         stop_all()
+
+if __name__ == "__main__":
+    main()
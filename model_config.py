@@ -0,0 +1,151 @@
+"""
+model_config.py - single source of truth for models/models.yaml
+Shared by main.py (server launch, /w/models) and set_props.py (props
+generation) so the config is parsed and validated in exactly one place,
+memoized per process on top of the on-disk yaml_cache.
+"""
+
+import json
+import sys
+from functools import cache
+from pathlib import Path
+
+from yaml_cache import load_yaml_cached
+
+# Startup paths are cached accessors rather than module constants so the
+# resolve() syscall happens lazily, on first use, at most once
+
+@cache
+def root_dir():
+    return Path(__file__).parent.resolve()
+
+
+@cache
+def root_dir_str():
+    return str(root_dir())
+
+
+@cache
+def models_yaml_path():
+    return root_dir() / "models" / "models.yaml"
+
+
+@cache
+def props_path():
+    return root_dir() / "webui" / "public" / "props"
+
+
+@cache
+def w_models_path():
+    return root_dir() / "webui" / "public" / "w-models.json"
+
+
+@cache
+def w_models_dist_path():
+    return root_dir() / "webui" / "dist" / "w-models.json"
+
+
+@cache
+def load_config():
+    """Parse and validate models.yaml once per process."""
+    path = models_yaml_path()
+    if not path.exists():
+        print(f"[ERROR] {path} not found")
+        sys.exit(1)
+    data = load_yaml_cached(path)
+    if not isinstance(data, dict) or "models" not in data:
+        print("[ERROR] models.yaml must contain a 'models:' key")
+        sys.exit(1)
+    return data
+
+
+def load_models():
+    return load_config()["models"]
+
+
+def _absolutize_arg(arg):
+    """Rewrite a repo-relative path argument (e.g. -m models/foo.gguf) to
+    an absolute one, so servers can be spawned without a cwd override.
+    Matches the old cwd=ROOT_DIR behavior: anything with a path separator
+    is anchored at the repo root."""
+    s = str(arg)
+    if "/" in s and not Path(s).is_absolute():
+        return str(root_dir() / s)
+    return s
+
+
+def build_command(name, cfg):
+    """Resolve a model's server argv once; None if it cannot be run."""
+    runtime = cfg.get("runtime", {})
+    bin_path = runtime.get("bin")
+    if not bin_path:
+        print(f"[WARN] No runtime.bin for {name}, skipping")
+        return None
+    bin_abs = Path(bin_path) if Path(bin_path).is_absolute() else root_dir() / bin_path
+    if not bin_abs.exists():
+        print(f"[ERROR] Binary not found: {bin_abs}")
+        return None
+    return [str(bin_abs)] + [_absolutize_arg(a) for a in runtime.get("args", [])]
+
+
+def build_commands(models):
+    """Precompute the spawn argv for every runnable model at load time,
+    so the launch path does no path resolution or stat calls."""
+    cmds = {}
+    for name, cfg in models.items():
+        cmd = build_command(name, cfg)
+        if cmd is not None:
+            cmds[name] = cmd
+    return cmds
+
+
+def build_models_payload(models):
+    """Serialize the enriched /w/models list to JSON bytes."""
+    enriched = []
+    for name, cfg in models.items():
+        enriched.append({
+            "id": name,  # short stable id
+            "name": name,
+            "display_name": cfg.get("display_name", Path(name).stem),
+            "type": cfg.get("type", "llama"),
+            "runtime": cfg.get("runtime", {}),
+        })
+    return json.dumps({"object": "list", "data": enriched}).encode()
+
+
+def build_props(models):
+    """Frontend props blob served from webui/public/props."""
+    return {
+        "app_name": "WarriorGPT",
+        "default_model": next(iter(models)),
+        "models": [
+            {
+                "name": name,
+                "display_name": cfg.get("display_name", name),
+                "type": cfg.get("type", "openai"),
+            }
+            for name, cfg in models.items()
+        ],
+    }
+
+
+def write_props(models=None, out=None):
+    if models is None:
+        models = load_models()
+    (out or props_path()).write_text(json.dumps(build_props(models), indent=2))
+
+
+def write_w_models_json(models=None, out=None):
+    """Snapshot the /w/models payload as a static file the UI can fetch.
+
+    public/ only reaches the served tree at the next `npm run build`, so
+    when a built dist exists the snapshot is written there too — that is
+    the directory both serving paths (Flask static and vite preview)
+    actually hand out.
+    """
+    if models is None:
+        models = load_models()
+    payload = build_models_payload(models)
+    (out or w_models_path()).write_bytes(payload)
+    if out is None and w_models_dist_path().parent.is_dir():
+        w_models_dist_path().write_bytes(payload)
@@ -104,7 +104,9 @@ export const THEMES = ['light', 'dark'].concat(
 export type AppConfig = typeof CONFIG_DEFAULT;
 
 // ——— Extras that some components expect (harmless to include) ———
-export const MODELS_ENDPOINT = `http://localhost:5000/w/models`;
+// Static snapshot written by the launcher at boot (see set_props.py /
+// main.py); served from the same origin as the app itself.
+export const MODELS_ENDPOINT = `${BASE_URL}/w-models.json`;
 export const CHAT_ENDPOINT = `${BASE_URL}/v1/chat/completions`;
 
 // Keep labels as plain strings in SettingDialog; ensure these are strings, not symbols
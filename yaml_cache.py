@@ -0,0 +1,69 @@
+"""
+yaml_cache.py - mtime-keyed on-disk cache for parsed YAML files
+Parsing models.yaml on every invocation is a fixed cold-start tax; the
+file rarely changes, so cache the parsed result keyed by (path, mtime,
+size) and skip the parser entirely on a fingerprint match.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as _YamlLoader  # libyaml, much faster
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+CACHE_DIR = Path.home() / ".cache" / "wgpt" / "yaml"
+
+
+def load_yaml_cached(path):
+    """Parse a YAML file, reusing a cached result if the file is unchanged.
+
+    The cache key folds in mtime and size, so edits invalidate implicitly
+    and no explicit purge is ever needed.
+    """
+    path = Path(path)
+    st = os.stat(path)
+    key = f"{path.resolve()}:{st.st_mtime_ns}:{st.st_size}"
+    cache_file = CACHE_DIR / (hashlib.sha1(key.encode()).hexdigest() + ".pkl")
+
+    if cache_file.exists():
+        try:
+            with open(cache_file, "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass  # corrupt/partial cache entry; fall through and re-parse
+
+    # Binary mode lets libyaml consume bytes directly, skipping the decode
+    # step; load_all streams one document at a time instead of
+    # materializing the whole file, and extra documents merge into the
+    # first so models.yaml can be split with `---` separators
+    with open(path, "rb") as f:
+        docs = yaml.load_all(f, Loader=_YamlLoader)
+        data = next(docs, None)
+        for extra in docs:
+            if isinstance(data, dict) and isinstance(extra, dict):
+                for k, v in extra.items():
+                    if isinstance(v, dict) and isinstance(data.get(k), dict):
+                        data[k].update(v)
+                    else:
+                        data[k] = v
+            else:
+                data = extra
+
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # Write-tmp+rename so a concurrent reader never sees a partial pickle
+        fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_file)
+    except OSError:
+        pass  # cache is best-effort; parsing still succeeded
+
+    return data